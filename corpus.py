@@ -0,0 +1,206 @@
+"""
+Content-addressed store for a corpus of decoded save files from the same module.
+
+Saves from one module repeat the same trait specs (the type side of each decorator)
+for every copy of every piece, so we intern each distinct decoded spec once under a
+hash of its content, and keep only the per-piece state inline with a reference to
+its spec id.  The store is a single sqlite file:
+
+    spec(id, kind, body)    -- body is the json for the spec side of one trait
+    save(name, body)        -- body is the decodeSave json with traits interned
+
+Each interned trait looks like {"spec": "<id>", ...state fields...}, which
+exportSave rehydrates to the original decodeSave shape.
+"""
+
+import sqlite3
+import json
+import hashlib
+import os
+from os import path
+
+from decoder import jsonDefault
+from counters import _pieceDecoders
+
+
+_schema = """
+CREATE TABLE IF NOT EXISTS spec (id TEXT PRIMARY KEY, kind TEXT NOT NULL, body TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS save (name TEXT PRIMARY KEY, body TEXT NOT NULL);
+"""
+
+
+def _dumps(v, sort_keys=False):
+    # keep field order when storing so export matches the decodeSave output exactly
+    return json.dumps(v, sort_keys=sort_keys, separators=(',', ':'), default=jsonDefault)
+
+
+def specId(spec):
+    """content hash for a decoded spec, which includes its kind"""
+    return hashlib.sha1(_dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _specKeys(kind):
+    """field names that come from the spec side of a decoded trait of this kind"""
+    decoder = _pieceDecoders.get(kind)
+    if decoder is None:
+        # undecoded traits keep the raw type and state, see counters.decodePiece
+        return ['type']
+    return getattr(decoder, 'specKeys', [])
+
+
+def _splitMark(trait):
+    # counters.Marker has its labels in the spec and values in the state, merged as one dict
+    marks = trait['marks']
+    return dict(kind=trait['kind'], labels=list(marks.keys())), dict(values=list(marks.values()))
+
+
+def _joinMark(spec, state):
+    return dict(kind=spec['kind'], marks=dict(zip(spec['labels'], state['values'])))
+
+
+# (split, join) for traits whose decoded fields don't divide cleanly by specKeys
+_traitSplitters = dict(
+    mark=(_splitMark, _joinMark),
+)
+
+
+def splitTrait(trait):
+    """split a decoded trait into its (spec, state) parts, both dicts with kind in spec"""
+    if trait['kind'] in _traitSplitters:
+        return _traitSplitters[trait['kind']][0](trait)
+    keys = set(_specKeys(trait['kind']))
+    spec = dict(kind=trait['kind'])
+    state = {}
+    for (k, v) in trait.items():
+        if k in keys:
+            spec[k] = v
+        elif k != 'kind':
+            state[k] = v
+    return spec, state
+
+
+def joinTrait(spec, state):
+    """inverse of splitTrait"""
+    if spec['kind'] in _traitSplitters:
+        return _traitSplitters[spec['kind']][1](spec, state)
+    trait = dict(kind=spec['kind'])
+    trait.update((k, v) for (k, v) in spec.items() if k != 'kind')
+    trait.update(state)
+    return trait
+
+
+def _mapPieces(decoded, f):
+    """apply f to each trait in the restorePieces add commands, returning a new decoded save"""
+    cmds = []
+    for cmd in decoded['restorePieces']:
+        if 'add' in cmd:
+            add = dict(cmd['add'])
+            add['piece'] = [f(trait) for trait in add['piece']]
+            cmd = dict(add=add)
+        cmds.append(cmd)
+    return dict(decoded, restorePieces=cmds)
+
+
+def openCorpus(fname):
+    db = sqlite3.connect(fname)
+    db.executescript(_schema)
+    return db
+
+
+def importSave(db, name, decoded, replace=False):
+    """intern the trait specs of a decoded save and store it under name, returning the number of new specs"""
+    if not replace and db.execute('SELECT 1 FROM save WHERE name = ?', (name,)).fetchone():
+        raise ValueError('Save {:s} is already in the corpus'.format(name))
+    specs = {}
+
+    def intern(trait):
+        spec, state = splitTrait(trait)
+        id = specId(spec)
+        specs[id] = spec
+        return dict(spec=id, **state)
+
+    body = _mapPieces(decoded, intern)
+    with db:
+        before = db.total_changes
+        db.executemany(
+            'INSERT OR IGNORE INTO spec (id, kind, body) VALUES (?, ?, ?)',
+            ((id, spec['kind'], _dumps(spec)) for (id, spec) in specs.items())
+        )
+        added = db.total_changes - before
+        db.execute('INSERT OR REPLACE INTO save (name, body) VALUES (?, ?)', (name, _dumps(body)))
+    return added
+
+
+def exportSave(db, name):
+    """rehydrate the decodeSave structure for the named save"""
+    row = db.execute('SELECT body FROM save WHERE name = ?', (name,)).fetchone()
+    if row is None:
+        raise KeyError(name)
+    specs = {}
+
+    def rehydrate(trait):
+        id = trait['spec']
+        if id not in specs:
+            row = db.execute('SELECT body FROM spec WHERE id = ?', (id,)).fetchone()
+            if row is None:
+                raise KeyError(id)
+            specs[id] = json.loads(row[0])
+        return joinTrait(specs[id], {k: v for (k, v) in trait.items() if k != 'spec'})
+
+    return _mapPieces(json.loads(row[0]), rehydrate)
+
+
+def saveNames(db):
+    return [name for (name,) in db.execute('SELECT name FROM save ORDER BY name')]
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+    import logging
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = ArgumentParser(description='Import or export decoded saves from a corpus store')
+    parser.add_argument('corpus', help='sqlite file for the corpus store')
+    sub = parser.add_subparsers(dest='cmd')
+    p = sub.add_parser('import', help='import decoded saves (.json from decodeSave, or .vsav)')
+    p.add_argument('files', nargs='+')
+    p.add_argument('--root', default='.', help='saves are named by their path relative to root')
+    p.add_argument('--replace', action='store_true', help='replace saves already in the corpus')
+    p = sub.add_parser('export', help='write a rehydrated save as json')
+    p.add_argument('name')
+    p.add_argument('output')
+    sub.add_parser('list', help='list saves in the corpus')
+    sub.add_parser('stats', help='compare the corpus size with the decodeSave json it replaces')
+    args = parser.parse_args()
+
+    db = openCorpus(args.corpus)
+    if args.cmd == 'import':
+        for f in args.files:
+            name = path.relpath(f, args.root).replace(os.sep, '/')
+            if path.splitext(f)[1] == '.vsav':
+                from translate import loadSave
+                decoded = loadSave(f)
+            else:
+                with open(f) as fin:
+                    decoded = json.load(fin)
+            try:
+                n = importSave(db, name, decoded, args.replace)
+            except ValueError as e:
+                logging.error('Skipping {:s}: {!s}, use --replace to overwrite'.format(f, e))
+                continue
+            logging.info('Imported {:s} with {:d} new specs'.format(name, n))
+    elif args.cmd == 'export':
+        with open(args.output, 'w') as f:
+            json.dump(exportSave(db, args.name), f, indent=4)
+    elif args.cmd == 'stats':
+        # size of the indented json decodeSave would write for each save vs the whole store
+        names = saveNames(db)
+        size = sum(len(json.dumps(exportSave(db, name), indent=4).encode('utf-8')) for name in names)
+        (nspecs,) = db.execute('SELECT COUNT(*) FROM spec').fetchone()
+        print('{:d} saves, {:d} specs: {:.1f} MB as json, {:.1f} MB in corpus'.format(
+            len(names), nspecs, size / 1e6, path.getsize(args.corpus) / 1e6))
+    else:
+        for name in saveNames(db):
+            print(name)
+    db.close()
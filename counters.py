@@ -1,11 +1,23 @@
-from decoder import disconcat, disdict, keyStroke, boolish, listOf, varargs, rgbColor, halign, valign, pdict
+from decoder import disconcat, disdict, keyStroke, boolish, listOf, varargs, rgbColor, halign, valign, pdict, \
+    pointArray, idArray
 
 
 def _protoDecoder(specProto, stateProto):
     nil = lambda s: {}
     f = disdict(specProto, ';') if specProto else nil
     g = disdict(stateProto, ';') if stateProto else nil
-    return lambda spec, state: {**f(spec), **g(state)}
+    decoder = lambda spec, state: {**f(spec), **g(state)}
+    # remember which decoded fields came from the spec side, see corpus.splitTrait
+    decoder.specKeys = list(specProto) if specProto else []
+    return decoder
+
+
+_footprintSpec = dict(
+    trailKey=keyStroke, menuCommand=str, initiallyVisible=boolish, globallyVisible=boolish,
+    circleRadius=int, fillColor=rgbColor, lineColor=rgbColor,
+    selectedTransparency=int, unSelectedTransparency=int,
+    edgePointBuffer=int, edgeDisplayBuffer=int, lineWidth=float
+)
 
 
 _pieceDecoders = dict(
@@ -75,12 +87,7 @@ _pieceDecoders = dict(
     ),
     # counters.Footprint
     footprint=_protoDecoder(
-        dict(
-            trailKey=keyStroke, menuCommand=str, initiallyVisible=boolish, globallyVisible=boolish,
-            circleRadius=int, fillColor=rgbColor, lineColor=rgbColor,
-            selectedTransparency=int, unSelectedTransparency=int,
-            edgePointBuffer=int, edgeDisplayBuffer=int, lineWidth=float
-        ),
+        _footprintSpec,
         dict(
            globalVisibility=boolish, startMapId=str, numPoints=int,
            points=varargs(disdict(dict(x=int, y=int), ','))
@@ -164,9 +171,25 @@ _pieceDecoders = dict(
     )
 )
 
+# variants of the numeric-heavy traits that decode to compact array-backed columns,
+# used in place of _pieceDecoders by decodePiece(..., compact=True)
+_compactPieceDecoders = dict(
+    stack=_protoDecoder(
+        None,
+        dict(mapId=str, x=int, y=int, ids=idArray),
+    ),
+    footprint=_protoDecoder(
+        _footprintSpec,
+        dict(
+           globalVisibility=boolish, startMapId=str, numPoints=int,
+           points=pointArray(',')
+        )
+    ),
+)
+
 _missingPieceDecoders = {}
 
-def decodePiece(type, state):
+def decodePiece(type, state, compact=False):
     # nested decorator structure gets represented as pairs of tab-separated types & states
     # we'll return as a list instead
     types = disconcat(type, '\t')
@@ -178,9 +201,10 @@ def decodePiece(type, state):
     kind, *maybeSpec = disconcat(t, ';', 1)
     spec = maybeSpec[0] if maybeSpec else None
     piece = dict(kind=kind)
-    if kind in _pieceDecoders:
+    decoder = (compact and _compactPieceDecoders.get(kind)) or _pieceDecoders.get(kind)
+    if decoder:
         try:
-            piece.update(_pieceDecoders[kind](spec,s))
+            piece.update(decoder(spec,s))
         except:
             print("Failed to decode {:s} with spec='{!s}', state='{!s}'".format(kind, spec, s))
             raise
@@ -190,6 +214,41 @@ def decodePiece(type, state):
 
     result = [piece]
     if len(types) == 2:
-        result = decodePiece(types[1], states[1]) + result
+        result = decodePiece(types[1], states[1], compact) + result
     return result
 
+
+
+if __name__ == '__main__':
+    # memory benchmark for compact decoding on a synthetic long-trail piece and a large stack
+    import json
+    import tracemalloc
+    from decoder import jsonDefault
+
+    n = 100000
+    trail = (
+        'footprint;84,130;Movement Trail;false;false;10;255,255,255;0,0,0;100;50;20;30;1.0' +
+        '\tpiece;;;ge-inf-1;ge-inf-1',
+        'true;Main Map;{:d};'.format(n) + ';'.join('{:d},{:d}'.format(i, 2*i) for i in range(n)) +
+        '\tMain Map;100;200;'
+    )
+    stack = ('stack', 'Main Map;100;200;' + ';'.join(str(1500000000000 + i) for i in range(n)))
+
+    for (name, (type, state)) in dict(trail=trail, stack=stack).items():
+        results = {}
+        for compact in (False, True):
+            tracemalloc.start()
+            piece = decodePiece(type, state, compact)
+            size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[compact] = json.dumps(piece, default=jsonDefault)
+            print('{:s} with {:d} entries, compact={!s}: {:.1f} MB'.format(name, n, compact, size / 1e6))
+        assert results[False] == results[True], "compact decoding changed the json for {:s}".format(name)
+
+    # values that don't fit the compact columns fall back to the plain decoding
+    for state in ['true;Main Map;2;3000000000,1;2,-3000000000\tMain Map;100;200;', 'true;Main Map;1;,1\tMain Map;;;']:
+        assert decodePiece(trail[0], state, True) == decodePiece(trail[0], state), \
+            "compact decoding differs for {!r}".format(state)
+    for state in ['Main Map;1;2;007;12345678901234567890', 'Main Map;1;2;1\u00b2', 'Main Map;1;2;\u0663']:
+        assert decodePiece('stack', state, True) == decodePiece('stack', state), \
+            "compact decoding differs for {!r}".format(state)
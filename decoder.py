@@ -1,6 +1,7 @@
 """low level modules to deal with tools.SequenceEncoder and tools.io.ObfuscatingOutputStream output"""
 
 import re
+from array import array
 
 
 MAGIC_HEADER = '!VCSK'
@@ -104,6 +105,90 @@ def varargs(typ):
     return f
 
 
+# compact column types used when decoding with compact=True, see counters._compactPieceDecoders
+# each serializes to the same json shape as the plain decoding via jsonDefault
+
+class PointArray:
+    """x, y points stored interleaved in a flat int32 array, serialized as a list of dict(x=, y=)"""
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data) // 2
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return dict(x=self.data[2*i], y=self.data[2*i+1])
+
+    def tojson(self):
+        return [self[i] for i in range(len(self))]
+
+    def toNumpy(self):
+        """Nx2 numpy view of the points, if numpy is available"""
+        import numpy
+        return numpy.frombuffer(self.data, dtype='i{:d}'.format(self.data.itemsize)).reshape(-1, 2)
+
+
+class IdArray:
+    """numeric piece ids stored in an int64 array, serialized as a list of str"""
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, i):
+        return str(self.data[i])
+
+    def tojson(self):
+        return [str(v) for v in self.data]
+
+
+def jsonDefault(o):
+    """json.dump default= hook to serialize the compact column types"""
+    if hasattr(o, 'tojson'):
+        return o.tojson()
+    raise TypeError('Object of type {:s} is not JSON serializable'.format(type(o).__name__))
+
+
+def pointArray(delim):
+    """varargs of delimited x, y pairs as a PointArray, falling back to a list of dicts if they don't fit"""
+    plain = varargs(disdict(dict(x=int, y=int), delim))
+
+    def f(ds):
+        try:
+            xys = [tuple(map(int, disconcat(d, delim))) for d in ds]
+            if any(len(xy) != 2 for xy in xys):
+                return plain(ds)
+            return PointArray(array('i', (v for xy in xys for v in xy)))
+        except (ValueError, OverflowError):
+            # missing values or coordinates outside the int32 range
+            return plain(ds)
+    f.varargs = True
+    return f
+
+
+def idArray(ds):
+    """varargs of piece ids as an IdArray, if they are all canonical int64 like the usual epoch millis"""
+    try:
+        # isdigit also accepts non-ascii digits that int() rejects or normalizes
+        if all(d.isdigit() and len(d) < 19 and str(int(d)) == d for d in ds):
+            return IdArray(array('q', map(int, ds)))
+    except ValueError:
+        pass
+    return list(ds)
+idArray.varargs = True
+
+
 # basic constructors that take a str => type
 
 def identity(s):
@@ -0,0 +1,274 @@
+"""
+Compact binary snapshot of a decoded save, which can be memory-mapped
+so that opening a save and reading any one piece is constant time,
+rather than re-parsing the indented json written by translate.decodeSave.
+
+Layout (all integers little-endian):
+
+    header      magic, version, string count, record count, and the byte offsets of
+                the string table, records, trait data and components
+    strings     (count+1) uint32 offsets followed by the utf-8 string blob
+    records     one fixed-width record per restorePieces command:
+                id, cmd, mapId, x, y, kind, trait data offset, trait data length
+                where id, cmd, mapId and kind are indices into the string table
+    data        json for each command body (less its id), referenced by the records
+    components  json list of the decoded save components
+
+String indices of -1 represent None.  An x or y of INT32_MIN means the value is not
+held in the record, either None or outside the int32 range, and is read from the json body.
+"""
+
+import json
+import mmap
+import struct
+
+from decoder import jsonDefault
+
+
+MAGIC = b'VSNP'
+VERSION = 1
+_NONE_STR = -1
+_NONE_INT = -2**31
+_INT_MAX = 2**31 - 1
+
+_header = struct.Struct('<4sIIIIIII')
+_record = struct.Struct('<iiiiiiII')
+_offset = struct.Struct('<I')
+
+
+def _dumps(v):
+    return json.dumps(v, separators=(',', ':'), default=jsonDefault).encode('utf-8')
+
+
+def _location(cmd, data):
+    """mapId, x, y and kind for a command, taken from the innermost trait of an added piece"""
+    if cmd == 'add' and data.get('piece'):
+        base = data['piece'][0]
+        return base.get('mapId'), base.get('x'), base.get('y'), base['kind']
+    return None, None, None, None
+
+
+def _packInt(v):
+    """record value for x or y, deferring to the json body when it doesn't fit"""
+    if v is None or not _NONE_INT < v <= _INT_MAX:
+        return _NONE_INT
+    return v
+
+
+def writeSnapshot(decoded, fname):
+    """write a decodeSave-shaped dict as a binary snapshot"""
+    strings = {}
+
+    def intern(s):
+        if s is None:
+            return _NONE_STR
+        return strings.setdefault(s, len(strings))
+
+    records = []
+    data = bytearray()
+    for command in decoded['restorePieces']:
+        ((cmd, body),) = command.items()
+        mapId, x, y, kind = _location(cmd, body)
+        blob = _dumps({k: v for (k, v) in body.items() if k != 'id'})
+        records.append(_record.pack(
+            intern(body['id']), intern(cmd), intern(mapId),
+            _packInt(x), _packInt(y),
+            intern(kind), len(data), len(blob)
+        ))
+        data += blob
+
+    encoded = [s.encode('utf-8') for s in strings]   # dict preserves insertion order == index
+    offsets = [0]
+    for s in encoded:
+        offsets.append(offsets[-1] + len(s))
+    stringTable = b''.join(_offset.pack(o) for o in offsets) + b''.join(encoded)
+    components = _dumps(decoded['components'])
+
+    stringsPos = _header.size
+    recordsPos = stringsPos + len(stringTable)
+    dataPos = recordsPos + _record.size * len(records)
+    componentsPos = dataPos + len(data)
+    with open(fname, 'wb') as f:
+        f.write(_header.pack(
+            MAGIC, VERSION, len(encoded), len(records),
+            stringsPos, recordsPos, dataPos, componentsPos
+        ))
+        f.write(stringTable)
+        f.write(b''.join(records))
+        f.write(data)
+        f.write(components)
+
+
+class PieceView:
+    """lightweight read-only view of one restorePieces command in a mapped snapshot"""
+    __slots__ = ('_snap', '_fields')
+
+    def __init__(self, snap, index):
+        self._snap = snap
+        self._fields = _record.unpack_from(snap._mm, snap._recordsPos + index * _record.size)
+
+    @property
+    def id(self):
+        return self._snap.string(self._fields[0])
+
+    @property
+    def cmd(self):
+        return self._snap.string(self._fields[1])
+
+    @property
+    def mapId(self):
+        return self._snap.string(self._fields[2])
+
+    @property
+    def x(self):
+        x = self._fields[3]
+        return self._location()[1] if x == _NONE_INT else x
+
+    @property
+    def y(self):
+        y = self._fields[4]
+        return self._location()[2] if y == _NONE_INT else y
+
+    def _location(self):
+        return _location(self.cmd, self.body)
+
+    @property
+    def kind(self):
+        return self._snap.string(self._fields[5])
+
+    @property
+    def body(self):
+        """the decoded command body, excluding id"""
+        start = self._snap._dataPos + self._fields[6]
+        return json.loads(self._snap._view[start:start + self._fields[7]].tobytes().decode('utf-8'))
+
+    @property
+    def piece(self):
+        """the list of decoded traits for an added piece"""
+        return self.body.get('piece')
+
+    def command(self):
+        """rebuild the {cmd: data} dict in the same shape as translate.decodeCommand"""
+        data = dict(id=self.id)
+        data.update(self.body)
+        return {self.cmd: data}
+
+    def __repr__(self):
+        return 'PieceView(id={!r}, kind={!r}, mapId={!r}, x={!r}, y={!r})'.format(
+            self.id, self.kind, self.mapId, self.x, self.y)
+
+
+class Snapshot:
+    """memory-mapped reader for a snapshot written by writeSnapshot"""
+
+    def __init__(self, fname):
+        self._f = open(fname, 'rb')
+        self._mm = self._view = None
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mm)
+            (
+                magic, version, self._nStrings, self._nRecords,
+                self._stringsPos, self._recordsPos, self._dataPos, self._componentsPos
+            ) = _header.unpack_from(self._mm, 0)
+            assert magic == MAGIC, "Not a save snapshot: {:s}".format(fname)
+            assert version == VERSION, "Unsupported snapshot version {:d}".format(version)
+        except:
+            self.close()
+            raise
+        self._blobPos = self._stringsPos + _offset.size * (self._nStrings + 1)
+        self._index = None
+
+    def string(self, i):
+        if i == _NONE_STR:
+            return None
+        start, end = struct.unpack_from('<II', self._mm, self._stringsPos + _offset.size * i)
+        return self._view[self._blobPos + start:self._blobPos + end].tobytes().decode('utf-8')
+
+    def __len__(self):
+        return self._nRecords
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._nRecords
+        if not 0 <= i < self._nRecords:
+            raise IndexError(i)
+        return PieceView(self, i)
+
+    def __iter__(self):
+        return (PieceView(self, i) for i in range(self._nRecords))
+
+    def find(self, id):
+        """look up a piece by id, building an id index on first use"""
+        if self._index is None:
+            self._index = {v.id: i for (i, v) in enumerate(self)}
+        return self[self._index[id]]
+
+    @property
+    def components(self):
+        return json.loads(self._view[self._componentsPos:].tobytes().decode('utf-8'))
+
+    def toDecoded(self):
+        """rebuild the full decodeSave structure"""
+        return dict(
+            restorePieces=[v.command() for v in self],
+            components=self.components,
+        )
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+        if self._mm is not None:
+            self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    from glob import glob
+    from os import path
+    from shutil import copy
+    from tempfile import TemporaryDirectory
+    import logging
+    from translate import decodeSave
+
+    logging.basicConfig(level=logging.INFO)
+
+    # round trip the json written by translate.decodeSave for the test saves through a snapshot
+    fs = glob('test/*.vsav')
+    assert fs, "No test/*.vsav fixtures found, run from the repository root"
+    logging.info('Checking snapshots of {!s}'.format(fs))
+    with TemporaryDirectory() as tmp:
+        for f in fs:
+            src = copy(f, tmp)
+            decodeSave(src)
+            with open(path.splitext(src)[0] + '.json') as fin:
+                decoded = json.load(fin)
+            snapName = path.splitext(src)[0] + '.snap'
+            writeSnapshot(decoded, snapName)
+            with Snapshot(snapName) as snap:
+                assert snap.toDecoded() == decoded, "Snapshot round trip failed for {:s}".format(f)
+                if len(snap):
+                    last = snap[-1]
+                    assert snap.find(last.id).command() == decoded['restorePieces'][-1]
+                    logging.info('{:s}: {:d} pieces, last {!r}'.format(snapName, len(snap), last))
+
+        # coordinates that don't fit the record still round trip via the json body
+        xys = [(None, None), (0, 0), (_NONE_INT, 2**31), (2**31, -2**31), (3000000000, -3000000000)]
+        decoded = dict(
+            restorePieces=[
+                dict(add=dict(id=str(i), piece=[dict(kind='piece', mapId='Main', x=x, y=y)]))
+                for (i, (x, y)) in enumerate(xys)
+            ],
+            components=[],
+        )
+        snapName = path.join(tmp, 'bounds.snap')
+        writeSnapshot(decoded, snapName)
+        with Snapshot(snapName) as snap:
+            assert snap.toDecoded() == decoded, "Snapshot round trip failed for out of range coordinates"
+            assert [(v.x, v.y) for v in snap] == xys, "Snapshot views lost out of range coordinates"
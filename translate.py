@@ -8,14 +8,14 @@ import xml.etree.ElementTree as ET
 from xmljson import yahoo as x2j
 import logging
 
-from decoder import maybe, disconcat, deobfuscate, seqdict, COMMAND_SEPARATOR
+from decoder import maybe, disconcat, deobfuscate, seqdict, jsonDefault, COMMAND_SEPARATOR
 from counters import decodePiece
 from component import decodeComponent
 from gamepiece import  decodePieceLayout, decodePieceImage
 
 
 _cmds = {'+': 'add', '-': 'remove', 'D': 'change', 'M': 'move'}
-def decodeCommand(s):
+def decodeCommand(s, compact=False):
     """
     module/BasicCommandEncoder.java
 
@@ -26,6 +26,9 @@ def decodeCommand(s):
     -/id
     D/id/state[/oldstate]
     M/id/mapid/x/y/underid/oldmapid/oldx/oldy/oldunderid/playerid
+
+    with compact=True, numeric-heavy piece traits decode to array-backed columns
+    (see counters._compactPieceDecoders) which serialize via decoder.jsonDefault
     """
     (c, id, *elts) = disconcat(s, '/')
     id = maybe(str)(id)
@@ -34,7 +37,7 @@ def decodeCommand(s):
     data = dict(id=id)
     if cmd == 'add':
         d = seqdict(['type', 'state'], elts)
-        data['piece'] = decodePiece(**d)
+        data['piece'] = decodePiece(compact=compact, **d)
     elif cmd == 'remove':
         assert len(elts) == 0, "Got {:d} args for remove, expected 0".format(len(elts))
     elif cmd == 'change':
@@ -51,7 +54,33 @@ def decodeCommand(s):
     return {cmd: data}
 
 
-def decodeSave(fname):
+def decodeSave(fname, compact=False, base=None):
+    """
+    Decode a savedGame via loadSave, writing <base>.raw and <base>.json
+    with base defaulting to fname less its extension
+    """
+    content = _savedGameContent(fname)
+    base = base or path.splitext(fname)[0]
+    with open(base + '.raw', 'w') as f:
+        f.write(content)
+    result = _decodeSavedGame(content, compact)
+    with open(base + '.json', 'w') as f:
+        json.dump(result, f, indent=4, default=jsonDefault)
+    return result
+
+
+def loadSave(fname, compact=False):
+    """decode a savedGame like decodeSave, but just return the result without writing any files"""
+    return _decodeSavedGame(_savedGameContent(fname), compact)
+
+
+def _savedGameContent(fname):
+    with ZipFile(fname).open('savedGame') as f:
+        saved = f.read().decode('utf-8')
+    return deobfuscate(saved)
+
+
+def _decodeSavedGame(content, compact):
     """
     Decode a savedGame which is ESC-separated with backlashed nested separators
 
@@ -63,12 +92,6 @@ def decodeSave(fname):
     [<restoreComponent>]
     end_save
     """
-    with ZipFile(fname).open('savedGame') as f:
-        saved = f.read().decode('utf-8')
-    content = deobfuscate(saved)
-    base = path.splitext(fname)[0]
-    with open(base + '.raw', 'w') as f:
-        f.write(content)
     begin, *cmds, end = disconcat(content, COMMAND_SEPARATOR)
     assert begin == 'begin_save' and end == 'end_save', "Expected start/end markers in savedGame"
     while cmds:
@@ -79,12 +102,10 @@ def decodeSave(fname):
     assert cmds, "Expected some non-empty commands?!"
     pcs, *comps = cmds
     assert pcs[0] == COMMAND_SEPARATOR, 'expected leading separator for restorePieces in {!s}'.format(pcs)
-    result = dict(
-        restorePieces=[decodeCommand(cmd) for cmd in disconcat(pcs, COMMAND_SEPARATOR)[1:]],
+    return dict(
+        restorePieces=[decodeCommand(cmd, compact) for cmd in disconcat(pcs, COMMAND_SEPARATOR)[1:]],
         components=[decodeComponent(c) for c in comps],
     )
-    with open(base + '.json', 'w') as f:
-        json.dump(result, f, indent=4)
 
 
 def getCoercedList(d, k):
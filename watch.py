@@ -0,0 +1,198 @@
+"""
+Watch a directory of save and build files, re-translating only those which are new
+or changed since their last decode, and append per-piece deltas for each re-decoded
+save to a change feed.
+
+Each translation is stamped with the mtime its source had when it was read, and a source
+is stale when its translation is missing or has a different mtime, so the watcher picks up
+where it left off after a restart.  Saves are translated to <name>.vsav.json, keyed on the
+full source name so that foo.vsav and foo.sav don't share a baseline.  Deltas are appended
+to the feed before the new baseline atomically replaces the old one, so a crash can repeat
+but never lose deltas.  Sources which fail to decode are skipped until they change again.
+Deltas use the add/remove/change/move vocabulary of translate.decodeCommand,
+and the feed is a file of json lines like:
+
+    {"save": "foo.vsav", "time": "...", "deltas": [{"move": {"id": ..., ...}}, ...]}
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from glob import glob
+from os import path
+
+from decoder import jsonDefault
+from translate import loadSave, decodeBuild
+
+
+SAVE_PATTERNS = ['*.vsav', '*.sav']
+BUILD_PATTERNS = ['buildFile*.yml']
+_location = ('mapId', 'x', 'y')
+
+
+def saveOutput(fname):
+    return fname + '.json'
+
+
+def buildOutput(fname):
+    # as written by translate.decodeBuild
+    return path.splitext(fname)[0] + '.json'
+
+
+def isStale(fname, output, failures):
+    """
+    whether a source needs translating, where failures maps path => mtime
+    for sources which failed to decode; a source which has vanished is not stale
+    """
+    out = output(fname)
+    try:
+        mtime = path.getmtime(fname)
+    except OSError:
+        return False
+    if failures.get(fname) == mtime:
+        return False
+    return not path.exists(out) or path.getmtime(out) != mtime
+
+
+def staleFiles(directory, patterns, output, failures):
+    fs = sorted(f for p in patterns for f in glob(path.join(directory, p)))
+    return [f for f in fs if isStale(f, output, failures)]
+
+
+def _stamp(out, mtime):
+    """mark a translation with the mtime of the source it was read from"""
+    os.utime(out, (mtime, mtime))
+
+
+def _pieces(decoded):
+    """map piece id => list of traits for the added pieces in a decoded save"""
+    if not decoded:
+        return {}
+    return {
+        cmd['add']['id']: cmd['add']['piece']
+        for cmd in decoded['restorePieces'] if 'add' in cmd
+    }
+
+
+def _unplaced(piece):
+    """the piece with the location removed from its innermost trait"""
+    base = {k: v for (k, v) in piece[0].items() if k not in _location}
+    return [base] + piece[1:]
+
+
+def diffSaves(old, new):
+    """list the add/remove/change/move deltas between two decoded saves, matching pieces by id"""
+    olds = _pieces(old)
+    news = _pieces(new)
+    deltas = []
+    for (id, piece) in news.items():
+        prev = olds.get(id)
+        if prev is None:
+            deltas.append(dict(add=dict(id=id, piece=piece)))
+        elif prev == piece:
+            continue
+        elif _unplaced(prev) == _unplaced(piece):
+            o, n = prev[0], piece[0]
+            deltas.append(dict(move=dict(
+                id=id,
+                newMapId=n.get('mapId'), newX=n.get('x'), newY=n.get('y'),
+                oldMapId=o.get('mapId'), oldX=o.get('x'), oldY=o.get('y'),
+            )))
+        else:
+            deltas.append(dict(change=dict(id=id, state=piece, oldstate=prev)))
+    deltas.extend(dict(remove=dict(id=id)) for id in olds if id not in news)
+    return deltas
+
+
+def updateSave(fname, feed):
+    """re-decode a save, appending its deltas against the previous decode to the feed"""
+    out = saveOutput(fname)
+    old = None
+    if path.exists(out):
+        try:
+            with open(out) as f:
+                old = json.load(f)
+        except ValueError:
+            logging.warning('Ignoring unreadable baseline {:s}, treating all pieces as added'.format(out))
+    mtime = path.getmtime(fname)
+    # round trip through json so that values compare like the previous decode
+    new = json.loads(json.dumps(loadSave(fname), default=jsonDefault))
+    deltas = diffSaves(old, new)
+    if deltas:
+        entry = dict(save=path.basename(fname), time=datetime.now().isoformat(), deltas=deltas)
+        with open(feed, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+    # only replace the baseline once its deltas are in the feed
+    tmp = out + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(new, f, indent=4)
+    os.replace(tmp, out)
+    _stamp(out, mtime)
+    logging.info('{:s} has {:d} changes'.format(fname, len(deltas)))
+    return deltas
+
+
+def _updateBuild(fname):
+    mtime = path.getmtime(fname)
+    decodeBuild(fname)
+    _stamp(buildOutput(fname), mtime)
+
+
+def _update(fname, update, failures):
+    """apply update to a stale source, recording it in failures if it can't be decoded"""
+    try:
+        mtime = path.getmtime(fname)
+    except OSError:
+        return    # vanished since we listed the directory
+    try:
+        update(fname)
+        failures.pop(fname, None)
+        logging.info('Decoded {:s}'.format(fname))
+    except Exception:
+        if path.exists(fname):
+            failures[fname] = mtime
+        logging.exception('Failed to update {:s}, skipping until it changes'.format(fname))
+
+
+def updateDirectory(directory, feed, failures=None):
+    """
+    translate any new or changed saves and build files, returning the number of files processed;
+    pass the same failures dict to each call to skip sources which failed until they change
+    """
+    failures = {} if failures is None else failures
+    saves = staleFiles(directory, SAVE_PATTERNS, saveOutput, failures)
+    builds = staleFiles(directory, BUILD_PATTERNS, buildOutput, failures)
+    for f in saves:
+        _update(f, lambda f: updateSave(f, feed), failures)
+    for f in builds:
+        _update(f, _updateBuild, failures)
+    return len(saves) + len(builds)
+
+
+def watch(directory, feed, interval=5.0):
+    """poll the directory forever, re-translating whatever has changed"""
+    failures = {}
+    while True:
+        updateDirectory(directory, feed, failures)
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = ArgumentParser(description='Incrementally translate saves and build files in a directory')
+    parser.add_argument('directory', nargs='?', default='test')
+    parser.add_argument('--feed', help='change feed file, default <directory>/changes.jsonl')
+    parser.add_argument('--interval', type=float, default=5.0, help='polling interval in seconds')
+    parser.add_argument('--once', action='store_true', help='process the directory once and exit')
+    args = parser.parse_args()
+
+    feed = args.feed or path.join(args.directory, 'changes.jsonl')
+    if args.once:
+        updateDirectory(args.directory, feed)
+    else:
+        watch(args.directory, feed, args.interval)